@@ -11,6 +11,8 @@ LUI_OPCODE = "0110111"
 AUIPC_OPCODE = "0010111"
 SYSTEM_OPCODE = "1110011"
 RV32M_OPCODE = "0110011"
+ITYPE64_OPCODE = "0011011"
+RTYPE64_OPCODE = "0111011"
 
 
 class Const:
@@ -134,6 +136,9 @@ class Command:
     def parse(self, cmd):
         raise NotImplementedError()
 
+    def immediate(self, word: int) -> int:
+        return 0
+
     @staticmethod
     def get_key_values(cmd):
         raise NotImplementedError()
@@ -187,11 +192,13 @@ class RType(Command):
 
 
 class IType(Command):
+    ARITHMETIC_OPCODES = [ITYPE_OPCODE_GROUP1]
+
     def parse(self, cmd):
         rd = cmd[7:12]
         rs1 = cmd[15:20]
-        if self.funct3 in [Funct3(1), Funct3(5)] and self.opcode == ITYPE_OPCODE_GROUP1:
-            imm = cmd[20:25]
+        if self.is_shift():
+            imm = cmd[20:20 + self.shamt_bits()]
         else:
             if int(cmd[31]):
                 imm = cmd[20:31]
@@ -199,11 +206,22 @@ class IType(Command):
                 imm -= 2 ** 11
             else:
                 imm = cmd[20:32]
-        if self.opcode == Opcode(ITYPE_OPCODE_GROUP1):
+        if self.opcode in self.ARITHMETIC_OPCODES:
             return self.name + " " + ", ".join(map(str, [Register(rd), Register(rs1), Immediate(imm, length=12)]))
         else:
             return self.name + " " + str(Register(rd)) + ", " + f"{Immediate(imm, length=12)}({Register(rs1)})"
 
+    def immediate(self, word: int) -> int:
+        if self.is_shift():
+            return (word >> 20) & ((1 << self.shamt_bits()) - 1)
+        return sign_extend(word >> 20, 12)
+
+    def is_shift(self):
+        return self.funct3 in [Funct3(1), Funct3(5)] and self.opcode in self.ARITHMETIC_OPCODES
+
+    def shamt_bits(self):
+        return 5
+
     @staticmethod
     def get_key_values(cmd):
         funct3 = Funct3(cmd[12:15])
@@ -221,6 +239,30 @@ class IType(Command):
         self.opcode = opcode
 
 
+class IType64(IType):
+    """
+    RV64I I-type: slli/srli/srai take a 6-bit shamt and are keyed by funct6,
+    the OP-IMM-32 word variants (addiw, slliw, ...) keep the 5-bit one.
+    """
+    ARITHMETIC_OPCODES = [ITYPE_OPCODE_GROUP1, ITYPE64_OPCODE]
+
+    def shamt_bits(self):
+        return 6 if self.opcode == ITYPE_OPCODE_GROUP1 else 5
+
+    @staticmethod
+    def get_key_values(cmd):
+        funct3 = Funct3(cmd[12:15])
+        opcode = Opcode(cmd[0:7])
+        if funct3 in [Funct3(1), Funct3(5)] and opcode == ITYPE_OPCODE_GROUP1:
+            # shamt[5] sits in bit 25, drop it from the funct7 key
+            funct7 = Funct7(cmd[26:32] + "0")
+        elif funct3 in [Funct3(1), Funct3(5)] and opcode == ITYPE64_OPCODE:
+            funct7 = Funct7(cmd[25:32])
+        else:
+            funct7 = None
+        return opcode, funct3, funct7
+
+
 class SType(Command):
     def __init__(self, name, funct3: Funct3, opcode: Opcode):
         super().__init__(name, "S")
@@ -238,6 +280,9 @@ class SType(Command):
         rs2 = cmd[20:25]
         return self.name + " " + str(Register(rs2)) + ", " + f"{Immediate(imm, repr_radix=16)}({Register(rs1)})"
 
+    def immediate(self, word: int) -> int:
+        return sign_extend(((word >> 25) << 5) | ((word >> 7) & 0x1f), 12)
+
     @staticmethod
     def get_key_values(cmd):
         return Opcode(cmd[0:7]), Funct3(cmd[12:15])
@@ -262,6 +307,10 @@ class BType(Command):
 
         return self.name + " " + ", ".join(map(str, [Register(rs1), Register(rs2), Immediate(imm)]))
 
+    def immediate(self, word: int) -> int:
+        imm = ((word >> 31) << 12) | (((word >> 7) & 1) << 11) | (((word >> 25) & 0x3f) << 5) | (((word >> 8) & 0xf) << 1)
+        return sign_extend(imm, 13)
+
     @staticmethod
     def get_key_values(cmd):
         return Opcode(cmd[0:7]), Funct3(cmd[12:15])
@@ -279,6 +328,10 @@ class UType(Command):
 
         return self.name + " " + str(Register(rd)) + ", " + str(Immediate(imm, repr_radix=16))
 
+    def immediate(self, word: int) -> int:
+        # imm[31:12], as written in assembly
+        return word >> 12
+
     @staticmethod
     def get_key_values(cmd):
         return Opcode(cmd[0:7])
@@ -297,6 +350,10 @@ class JType(Command):
         # imm = bin(int(imm[::-1], 2) << 1)[2:].rjust(len(imm) + 1, "0")
         return self.name + " " + str(Register(rd)) + " " + str(Immediate(imm, repr_radix=2))
 
+    def immediate(self, word: int) -> int:
+        imm = ((word >> 31) << 20) | (((word >> 12) & 0xff) << 12) | (((word >> 20) & 1) << 11) | (((word >> 21) & 0x3ff) << 1)
+        return sign_extend(imm, 21)
+
     @staticmethod
     def get_key_values(cmd):
         return Opcode(cmd[0:7])
@@ -352,9 +409,6 @@ class CommandList:
         self._cmdmap = dict((_get_keys(cmd), cmd) for cmd in cmdlist)
         self._opcodes = dict((cmd.opcode, type(cmd)) for cmd in cmdlist)
 
-        print(self._opcodes)
-        print(self._cmdmap)
-
     def get_command(self, item: tuple) -> Command:
         res = self._cmdmap.get(item)
         if not res:
@@ -367,7 +421,7 @@ class CommandList:
 
 # https://github.com/MPSU/APS-info/blob/master/lect-pm/pic/isariscv.png
 
-CMDLIST = CommandList([
+RV32_COMMANDS = [
     # RTYPE:
     RType("add", Funct3(0), Funct7(0), Opcode(RTYPE_OPCODE)),
     RType("sub", Funct3(0), Funct7(20), Opcode(RTYPE_OPCODE)),
@@ -426,7 +480,39 @@ CMDLIST = CommandList([
     RType("rem", Funct3(6), Funct7(1), Opcode(RV32M_OPCODE)),
     RType("remu", Funct3(7), Funct7(1), Opcode(RV32M_OPCODE))
 
-])
+]
+
+CMDLIST = CommandList(RV32_COMMANDS)
+
+RV64_COMMANDS = [
+    IType64(cmd.name, cmd.funct3, cmd.funct7, cmd.opcode) if isinstance(cmd, IType) and cmd.opcode == ITYPE_OPCODE_GROUP1
+    else cmd for cmd in RV32_COMMANDS
+] + [
+    # RV64I loads and stores:
+    IType("lwu", Funct3(6), None, Opcode(ITYPE_OPCODE_GROUP2)),
+    IType("ld", Funct3(3), None, Opcode(ITYPE_OPCODE_GROUP2)),
+    SType("sd", Funct3(3), Opcode(STYPE_OPCODE)),
+    # RV64I OP-IMM-32:
+    IType64("addiw", Funct3(0), None, Opcode(ITYPE64_OPCODE)),
+    IType64("slliw", Funct3(1), Funct7(0), Opcode(ITYPE64_OPCODE)),
+    IType64("srliw", Funct3(5), Funct7(0), Opcode(ITYPE64_OPCODE)),
+    IType64("sraiw", Funct3(5), Funct7(20), Opcode(ITYPE64_OPCODE)),
+    # RV64I OP-32:
+    RType("addw", Funct3(0), Funct7(0), Opcode(RTYPE64_OPCODE)),
+    RType("subw", Funct3(0), Funct7(20), Opcode(RTYPE64_OPCODE)),
+    RType("sllw", Funct3(1), Funct7(0), Opcode(RTYPE64_OPCODE)),
+    RType("srlw", Funct3(5), Funct7(0), Opcode(RTYPE64_OPCODE)),
+    RType("sraw", Funct3(5), Funct7(20), Opcode(RTYPE64_OPCODE)),
+    # RV64M
+    RType("mulw", Funct3(0), Funct7(1), Opcode(RTYPE64_OPCODE)),
+    RType("divw", Funct3(4), Funct7(1), Opcode(RTYPE64_OPCODE)),
+    RType("divuw", Funct3(5), Funct7(1), Opcode(RTYPE64_OPCODE)),
+    RType("remw", Funct3(6), Funct7(1), Opcode(RTYPE64_OPCODE)),
+    RType("remuw", Funct3(7), Funct7(1), Opcode(RTYPE64_OPCODE)),
+]
+
+CMDLIST64 = CommandList(RV64_COMMANDS)
+CMDLISTS = {32: CMDLIST, 64: CMDLIST64}
 
 
 def is_compressed(line):
@@ -434,11 +520,31 @@ def is_compressed(line):
     return False
 
 
-def parse_line(line):
-    instruction = Instruction(line[::-1])
+def sign_extend(value, bits):
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+
+def find_command(instruction: Instruction, cmdlist=CMDLIST) -> Command:
     opcode = instruction[0:7]
-    cmd = CMDLIST.get_command(
-        CMDLIST.get_command_type(Opcode(opcode)).get_key_values(instruction)
-    )
+    command_type = cmdlist.get_command_type(Opcode(opcode))
+    if not command_type:
+        return UnknownCommand(opcode)
+    return cmdlist.get_command(command_type.get_key_values(instruction))
+
+
+def parse_line(line, cmdlist=CMDLIST):
+    instruction = Instruction(line[::-1])
+    cmd = find_command(instruction, cmdlist)
 
     return cmd.parse(instruction)
+
+
+def decode_fields(word: int, cmdlist=CMDLIST) -> (str, int, int, int, int):
+    """
+    Structured decode of one 32-bit word: (mnemonic, rd, rs1, rs2, imm).
+    Register fields are taken from their fixed positions whether the format uses them or not.
+    """
+    cmd = find_command(Instruction(bin(word)[2:].rjust(32, "0")[::-1]), cmdlist)
+    name = "unknown" if isinstance(cmd, UnknownCommand) else cmd.name
+    return name, (word >> 7) & 0x1f, (word >> 15) & 0x1f, (word >> 20) & 0x1f, cmd.immediate(word)
@@ -0,0 +1,32 @@
+import bz2
+import gzip
+import lzma
+
+MAGIC_LENGTH = 6
+STREAM_TYPES = (gzip.GzipFile, lzma.LZMAFile, bz2.BZ2File)
+MAGICS = [
+    (b"\x1f\x8b", gzip.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"BZh", bz2.open),
+]
+
+
+def open_input(filename: str, mode="rb"):
+    """
+    Opens `filename` for reading, transparently decompressing .gz/.xz/.bz2 inputs.
+    The codec is picked by magic bytes, so the file extension does not matter.
+    Compressed streams are decoded on the fly and never materialized on disk.
+    """
+    with open(filename, "rb") as f:
+        magic = f.read(MAGIC_LENGTH)
+    for prefix, opener in MAGICS:
+        if magic.startswith(prefix):
+            if "b" not in mode and "t" not in mode:
+                mode += "t"
+            return opener(filename, mode)
+    return open(filename, mode)
+
+
+def is_compressed(file) -> bool:
+    """True for the decompressing streams open_input returns: they seek backwards by decoding again from the start."""
+    return isinstance(file, STREAM_TYPES)
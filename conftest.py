@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+import elf
+from compressed import open_input
+
+
+@pytest.fixture
+def elf_file():
+    """
+    elf_file(path or binary file) -> ElfFile with its header and section header table parsed.
+    Paths are opened with open_input and closed after the test.
+    """
+    opened = []
+
+    def _open(source) -> elf.ElfFile:
+        if isinstance(source, (str, os.PathLike)):
+            source = open_input(str(source))
+            opened.append(source)
+        file = elf.ElfFile(source)
+        file.parse_header()
+        file.parse_section_header_table()
+        return file
+
+    yield _open
+    for f in opened:
+        f.close()
@@ -1,99 +1,170 @@
 from exceptions import *
+from compressed import is_compressed, open_input
 import commands as cmd
+import memo
 import typing
+import heapq
+import mmap
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from functools import lru_cache, partial
+from itertools import compress
 
 HEADER_SECTION_LENGTH = 16
+HEADER_SIZE = 64
+ELF_MAGIC = b"\x7fELF"
+EI_CLASS = 4
+EI_DATA = 5
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+TEXT_CHUNK_SIZE = 1 << 16
+SKIP_CACHE_SIZE = 1 << 23
 COMMAND_SIZE = 4
 COMPRESSED_COMMAND_SIZE = 2
-ENDIAN = "little"
+# RISC-V instruction parcels are little-endian whatever the ELF data encoding is
+COMMAND_ENDIAN = "little"
+
+
+SYMBOL_BINDINGS = {
+    0: "LOCAL",
+    1: "GLOBAL",
+    2: "WEAK",
+    10: "LOOS",
+    12: "HIOS",
+    13: "LOPROC",
+    15: "HIPROC"
+}
+SYMBOL_TYPES = {
+    0: "NOTYPE",
+    1: "OBJECT",
+    2: "FUNC",
+    3: "SECTION",
+    4: "FILE",
+    5: "COMMON",
+    6: "TLS",
+    10: "LOOS",
+    12: "HIOS",
+    13: "LOPROC",
+    15: "HIPROC"
+}
+SYMBOL_VISIBILITIES = {
+    0: "DEFAULT",
+    1: "INTERNAL",
+    2: "HIDDEN",
+    3: "PROTECTED"
+}
+INDEX_MAGIC = b"RVIX"
+INDEX_VERSION = 2
+INDEX_ALIGN = 8
+MNEMONIC_SIZE = 16
+# magic, version, record size, records count/offset, mnemonics count/offset, symbols count,
+# symbol value/size/name/info/other/shndx column offsets, strtab size/offset
+INDEX_HEADER = struct.Struct("<4sHHQQQQQQQQQQQQQ")
+# virtual address, raw word, imm, mnemonic id, rd, rs1, rs2; 24 bytes so every address stays 8-aligned
+INDEX_RECORD = struct.Struct("<QIiHBBB3x")
+assert INDEX_RECORD.size == 24
+INDEX_SYMBOL_COLUMNS = (("value", "Q"), ("size", "Q"), ("name", "I"), ("info", "B"), ("other", "B"), ("shndx", "H"))
+
+SPECIAL_SHNDX = {
+    0: "UNDEF",
+    65521: "ABS"
+}
 
 
 class SHTConsts:
-    NAME_TEXT = int.from_bytes(bytes("\x1b\x00\x00\x00", encoding="raw_unicode_escape"), ENDIAN)
-    NAME_SYMTAB = int.from_bytes(bytes("\x01\x00\x00\x00", encoding="raw_unicode_escape"), ENDIAN)
-    NAME_STRTAB = int.from_bytes(bytes("\x09\x00\x00\x00", encoding="raw_unicode_escape"), ENDIAN)
-    TYPE_PROGBITS = int.from_bytes(bytes("\x01\x00\x00\x00", encoding="raw_unicode_escape"), ENDIAN)
-    TYPE_SYMTAB = int.from_bytes(bytes("\x02\x00\x00\x00", encoding="raw_unicode_escape"), ENDIAN)
-    TYPE_STRTAB = int.from_bytes(bytes("\x03\x00\x00\x00", encoding="raw_unicode_escape"), ENDIAN)
-
+    TYPE_PROGBITS = 1
+    TYPE_SYMTAB = 2
+    TYPE_STRTAB = 3
+    FLAG_EXECINSTR = 0x4
+
+
+class ElfLayout:
+    """
+    Record formats of one ELFCLASS / data encoding pair. Picked once from e_ident,
+    so parsing code never branches on the class or byte order per field.
+    """
+    HEADER_FIELDS = ["type", "machine", "version", "entry", "phoff", "shoff", "flags", "ehsize",
+                     "phentsize", "phnum", "shentsize", "shnum", "shstrndx"]
+
+    def __init__(self, xlen, endian):
+        self.xlen = xlen
+        self.endian = endian
+        prefix = "<" if endian == "little" else ">"
+        word = "I" if xlen == 32 else "Q"
+        self.header = struct.Struct(prefix + f"{HEADER_SECTION_LENGTH}xHHI{word * 3}IHHHHHH")
+        self.section = struct.Struct(prefix + f"II{word * 4}II{word * 2}")
+        if xlen == 32:
+            self.symbol_fields = [("name", "I"), ("value", "I"), ("size", "I"), ("info", "B"), ("other", "B"),
+                                  ("shndx", "H")]
+        else:
+            self.symbol_fields = [("name", "I"), ("info", "B"), ("other", "B"), ("shndx", "H"), ("value", "Q"),
+                                  ("size", "Q")]
+        self.symbol = struct.Struct(prefix + "".join(t for _, t in self.symbol_fields))
+        # field -> (byte offset inside an entry, array typecode), for SymtabColumns
+        self.symbol_columns = dict(
+            (name, (struct.calcsize(prefix + "".join(t for _, t in self.symbol_fields[:i])), typecode))
+            for i, (name, typecode) in enumerate(self.symbol_fields))
 
-class ByteArray:
-    def __init__(self, arr):
-        self.__arr = arr
+    def unpack_symbol(self, line: bytes) -> typing.Dict:
+        return dict(zip([name for name, _ in self.symbol_fields], self.symbol.unpack(line)))
 
-    def __getitem__(self, item):
-        if isinstance(item, int):
-            return self.__arr[item]
-        elif isinstance(item, slice):
-            return b"".join(self.__arr[item])
 
-    def get_slice(self, f, t):
-        return ByteArray(self.__arr[f:t])
-
-    def __repr__(self):
-        return str(self.__arr)
+LAYOUTS = {
+    (ELFCLASS32, ELFDATA2LSB): ElfLayout(32, "little"),
+    (ELFCLASS32, ELFDATA2MSB): ElfLayout(32, "big"),
+    (ELFCLASS64, ELFDATA2LSB): ElfLayout(64, "little"),
+    (ELFCLASS64, ELFDATA2MSB): ElfLayout(64, "big"),
+}
 
 
 class SectionHeaderElement:
-    def __init__(self, line: ByteArray):
-        self.__line = line
-        self.__OFFSET = 4
-        self.__cursor = 0
-
-        self.name = self.take4()
-        self.type = self.take4()
-        self.flags = self.take4()
-        self.address = self.take4()
-        self.offset = self.take4()
-        self.size = self.take4()
-        self.link = self.take4()
-        self.info = self.take4()
-        self.addralign = self.take4()
-        self.entsize = self.take4()
+    def __init__(self, line: bytes, layout: ElfLayout):
+        (self.name, self.type, self.flags, self.address, self.offset, self.size, self.link, self.info,
+         self.addralign, self.entsize) = layout.section.unpack(line)
         # print(self)
 
     def int_offset(self):
-        return int.from_bytes(self.offset, ENDIAN)
+        return self.offset
 
     def int_name(self):
-        return int.from_bytes(self.name, ENDIAN)
+        return self.name
 
     def int_size(self):
-        return int.from_bytes(self.size, ENDIAN)
+        return self.size
+
+    def is_code(self):
+        return self.type == SHTConsts.TYPE_PROGBITS and self.flags & SHTConsts.FLAG_EXECINSTR
 
-    def is_text(self):
-        # print(int.from_bytes(self.name, ENDIAN), SHTConsts.NAME_TEXT)
-        return int.from_bytes(self.name, ENDIAN) == SHTConsts.NAME_TEXT
+    def contains(self, address):
+        return self.address <= address < self.address + self.size
 
     def is_symtab(self):
-        return int.from_bytes(self.name, ENDIAN) == SHTConsts.NAME_SYMTAB
+        return self.type == SHTConsts.TYPE_SYMTAB
 
     def is_strtab(self):
-        return int.from_bytes(self.name, ENDIAN) == SHTConsts.NAME_STRTAB
-
-    def take4(self):
-        self.__cursor += self.__OFFSET
-        return self.__line[self.__cursor - self.__OFFSET:self.__cursor]
+        return self.type == SHTConsts.TYPE_STRTAB
 
     def __repr__(self):
-        return " ".join(map(lambda x: hex(x)[2:].rjust(8, "0"),
-                            [int.from_bytes(el, "big") for el in [self.type, self.address, self.offset, self.size]]))
+        return " ".join(map(lambda x: hex(x)[2:].rjust(8, "0"), [self.type, self.address, self.offset, self.size]))
 
 
 class SymtabElement:
-    def __init__(self, line: ByteArray, get_name):
-        self.__cursor = 0
-        self.__line = line
-        name = int.from_bytes(self.take(4), ENDIAN)
+    def __init__(self, line: bytes, get_name, layout: ElfLayout = LAYOUTS[ELFCLASS32, ELFDATA2LSB]):
+        fields = layout.unpack_symbol(line)
+        name = fields["name"]
         if name == 0:
             self.name = ""
         else:
             self.name = get_name(name)
-        self.value = int.from_bytes(self.take(4), ENDIAN)
-        self.size = int.from_bytes(self.take(4), ENDIAN)
-        self.info = self.take(1)
-        self.other = self.take(1)
-        self.__shndx = self.take(2)
+        self.value = fields["value"]
+        self.size = fields["size"]
+        self.info = fields["info"]
+        self.other = fields["other"]
+        self.__shndx = fields["shndx"]
 
         self.binding = None
         self.type = None
@@ -102,10 +173,6 @@ class SymtabElement:
         self.parse_info()
         self.parse_shndx()
 
-    def take(self, b):
-        self.__cursor += b
-        return self.__line[self.__cursor - b:self.__cursor]
-
     @property
     def shndx(self):
         if isinstance(self.__shndx, str):
@@ -114,47 +181,12 @@ class SymtabElement:
             return str(self.__shndx)
 
     def parse_info(self):
-        bindings = {
-            0: "LOCAL",
-            1: "GLOBAL",
-            2: "WEAK",
-            10: "LOOS",
-            12: "HIOS",
-            13: "LOPROC",
-            15: "HIPROC"
-        }
-        types = {
-            0: "NOTYPE",
-            1: "OBJECT",
-            2: "FUNC",
-            3: "SECTION",
-            4: "FILE",
-            5: "COMMON",
-            6: "TLS",
-            10: "LOOS",
-            12: "HIOS",
-            13: "LOPROC",
-            15: "HIPROC"
-        }
-        visibilities = {
-            0: "DEFAULT",
-            1: "INTERNAL",
-            2: "HIDDEN",
-            3: "PROTECTED"
-        }
-
-        self.binding = bindings.get(int.from_bytes(self.info, ENDIAN) >> 4)
-        self.type = types.get(int.from_bytes(self.info, ENDIAN) & 15)
-        self.visibility = visibilities.get(int.from_bytes(self.other, ENDIAN) & 3)
+        self.binding = SYMBOL_BINDINGS.get(self.info >> 4)
+        self.type = SYMBOL_TYPES.get(self.info & 15)
+        self.visibility = SYMBOL_VISIBILITIES.get(self.other & 3)
 
     def parse_shndx(self):
-        m = {
-            0: "UNDEF",
-            65521: "ABS"
-        }
-        if isinstance(self.__shndx, bytes):
-            self.__shndx = int.from_bytes(self.__shndx, ENDIAN)
-        a = m.get(self.__shndx)
+        a = SPECIAL_SHNDX.get(self.__shndx)
         if a:
             self.__shndx = a
 
@@ -166,43 +198,251 @@ class SymtabElement:
         return [self.value, self.size, self.type, self.binding, self.visibility, self.shndx, self.name]
 
 
+class SymtabColumns:
+    """
+    Column view of .symtab: one array per field instead of a SymtabElement per row.
+    Queries return row indices, names are only decoded for the rows that get printed.
+    """
+    SORT_KEYS = ("value", "size")
+
+    def __init__(self, symtab: bytes, strtab: bytes, layout: ElfLayout = LAYOUTS[ELFCLASS32, ELFDATA2LSB]):
+        entry = layout.symbol.size
+        symtab = symtab[:len(symtab) // entry * entry]
+        views = {}
+        columns = {}
+        for name, (offset, typecode) in layout.symbol_columns.items():
+            if typecode == "B":
+                columns[name] = symtab[offset::entry]
+                continue
+            view = views.get(typecode)
+            if view is None:
+                view = views[typecode] = array(typecode, symtab)
+                if sys.byteorder != layout.endian:
+                    view.byteswap()
+            columns[name] = view[offset // view.itemsize::entry // view.itemsize]
+
+        self.names = columns["name"]
+        self.values = columns["value"]
+        self.sizes = columns["size"]
+        self.info = columns["info"]
+        self.other = columns["other"]
+        self.shndx = columns["shndx"]
+        self.strtab = strtab
+
+    def __len__(self):
+        return len(self.values)
+
+    def query(self, types=None, bindings=None, shndx=None, prefix=None, sort=None, reverse=False, top=None) \
+            -> typing.List[int]:
+        """
+        Returns indices of the matching symbols.
+        types/bindings: names ("FUNC") or codes; shndx: section index, "UNDEF" or "ABS"; prefix: name prefix;
+        sort: "value" or "size", ascending unless `reverse`;
+        top: the `top` rows with the largest `sort` key (size by default), largest first, or with `reverse` the
+        smallest ones, smallest first.
+        """
+        # the column filters are 0/1 bytes per row, combined with one big-int AND and applied with one compress()
+        masks = []
+        if types is not None or bindings is not None:
+            types = _codes(types, SYMBOL_TYPES)
+            bindings = _codes(bindings, SYMBOL_BINDINGS)
+            table = bytes((types is None or i & 15 in types) and (bindings is None or i >> 4 in bindings)
+                          for i in range(256))
+            masks.append(self.info.translate(table))
+        if shndx is not None:
+            masks.append(self.__shndx_mask(_codes([shndx], SPECIAL_SHNDX).pop()))
+        mask = None
+        if masks:
+            mask = int.from_bytes(masks[0], "little")
+            for other in masks[1:]:
+                mask &= int.from_bytes(other, "little")
+            mask = mask.to_bytes(len(self), "little")
+
+        rows = range(len(self))
+        names = self.names
+        if mask is not None:
+            rows = compress(rows, mask)
+        if prefix:
+            # the name offset lookup is the expensive part, only do it for rows the other filters kept
+            if mask is not None:
+                rows = list(rows)
+                names = compress(names, mask)
+            rows = compress(rows, map(self.__name_offsets(prefix.encode("utf-8")).__contains__, names))
+
+        if top is not None:
+            select = heapq.nsmallest if reverse else heapq.nlargest
+            return select(top, rows, key=self.__column(sort or "size").__getitem__)
+        if sort is not None:
+            return sorted(rows, key=self.__column(sort).__getitem__, reverse=reverse)
+        return list(rows)
+
+    def __shndx_mask(self, shndx) -> bytes:
+        # compare the low and high byte planes of the column separately, a row matches if both do
+        data = self.shndx.tobytes()
+        low, high = (data[0::2], data[1::2]) if sys.byteorder == "little" else (data[1::2], data[0::2])
+        res = int.from_bytes(low.translate(_equals(shndx & 0xff)), "little")
+        res &= int.from_bytes(high.translate(_equals(shndx >> 8)), "little")
+        return res.to_bytes(len(self), "little")
+
+    def __name_offsets(self, prefix: bytes) -> typing.Set[int]:
+        # every strtab offset a name starting with `prefix` can have, found with one pass of find();
+        # interior offsets are kept too, the linker may point a name into the tail of another one
+        strtab = self.strtab
+        res = set()
+        if b"\x00" in prefix:
+            # a match would run past the end of the name
+            return res
+        pos = strtab.find(prefix, 1)
+        while pos != -1:
+            res.add(pos)
+            pos = strtab.find(prefix, pos + 1)
+        return res
+
+    def name(self, i) -> str:
+        start = self.names[i]
+        if start == 0:
+            return ""
+        end = self.strtab.find(b"\x00", start)
+        if end == -1:
+            end = len(self.strtab)
+        return self.strtab[start:end].decode("utf-8")
+
+    def as_list(self, i) -> typing.List:
+        shndx = self.shndx[i]
+        return [self.values[i], self.sizes[i], SYMBOL_TYPES.get(self.info[i] & 15),
+                SYMBOL_BINDINGS.get(self.info[i] >> 4), SYMBOL_VISIBILITIES.get(self.other[i] & 3),
+                SPECIAL_SHNDX.get(shndx) or str(shndx), self.name(i)]
+
+    def __column(self, key):
+        if key not in self.SORT_KEYS:
+            raise ValueError(f"can't sort symbols by {key}, expected one of {self.SORT_KEYS}")
+        return self.values if key == "value" else self.sizes
+
+
+@lru_cache(maxsize=None)
+def _equals(value) -> bytes:
+    """bytes.translate table mapping `value` to 1 and everything else to 0."""
+    return bytes(i == value for i in range(256))
+
+
+def _codes(names, mapping: typing.Dict[int, str]) -> typing.Optional[typing.Set[int]]:
+    if names is None:
+        return None
+    if isinstance(names, (str, int)):
+        names = [names]
+    reverse = dict((v, k) for k, v in mapping.items())
+    res = set()
+    for name in names:
+        if isinstance(name, int):
+            res.add(name)
+        elif name.upper() in reverse:
+            res.add(reverse[name.upper()])
+        else:
+            raise ValueError(f"unknown symbol attribute {name}, expected one of {list(reverse)}")
+    return res
+
+
 class ElfFile:
     # noinspection PyTypeChecker
     def __init__(self, file):
-        arr = []
-        byte = file.read(1)
-        while byte != b"":
-            # print(byte)
-            arr.append(byte)
-            byte = file.read(1)
-        self.__arr = ByteArray(arr)
+        self.__file = file
 
+        self.layout: ElfLayout = None
+        self.e_entry = None
         self.e_shoff = None
         self.e_shnum = None
-        self.e_shentsize = 40
+        self.e_shentsize = None
+        self.e_shstrndx = None
 
         self.text_header: SectionHeaderElement = None
         self.symtab_header: SectionHeaderElement = None
         self.strtab_header: SectionHeaderElement = None
+        self.__strtab = None
+        self.__compressed = is_compressed(file)
+        self.__cache = b""
+        self.__cache_offset = 0
+
+    def read(self, offset, size) -> bytes:
+        # A compressed stream can only seek backwards by decompressing again from the start, and the section
+        # header table at the end of the file is read before .text. So a forward skip keeps the last
+        # SKIP_CACHE_SIZE bytes it passes: .symtab and .strtab usually lie just before the table and are served
+        # from there, and so is .text when the whole image fits. Otherwise rewinding to .text decompresses the
+        # file once more up to the end of .text; sections that missed the cache cost a full second pass.
+        start = offset - self.__cache_offset
+        if 0 <= start and start + size <= len(self.__cache):
+            return self.__cache[start:start + size]
+        if self.__compressed and offset > self.__file.tell():
+            self.__skip_to(offset)
+        self.__file.seek(offset)
+        return self.__file.read(size)
+
+    def __skip_to(self, offset):
+        chunks = []
+        cached = 0
+        cursor = self.__file.tell()
+        while cursor < offset:
+            data = self.__file.read(min(TEXT_CHUNK_SIZE, offset - cursor))
+            if not data:
+                break
+            chunks.append(data)
+            cached += len(data)
+            cursor += len(data)
+            while cached - len(chunks[0]) >= SKIP_CACHE_SIZE:
+                cached -= len(chunks.pop(0))
+        self.__cache = b"".join(chunks)
+        self.__cache_offset = cursor - len(self.__cache)
+
+    @property
+    def xlen(self):
+        return self.layout.xlen
 
     def parse_header(self):
-        self.e_shoff = int.from_bytes(self.__arr[16 + 4 * 4:16 + 4 * 5], ENDIAN)
-        self.e_shnum = int.from_bytes(self.__arr[16 + 4 * 8:16 + 4 * 8 + 2], ENDIAN)
-        self.e_shentsize = int.from_bytes(self.__arr[16 + 4 * 8 - 2:16 + 4 * 8], ENDIAN)
+        header = self.read(0, HEADER_SIZE)
+        if header[:len(ELF_MAGIC)] != ELF_MAGIC:
+            raise BadElfHeader(f"not an ELF file: {header[:len(ELF_MAGIC)]}")
+        if len(header) <= EI_DATA:
+            raise BadElfHeader(f"truncated ELF header: {len(header)} bytes")
+        self.layout = LAYOUTS.get((header[EI_CLASS], header[EI_DATA]))
+        if self.layout is None:
+            raise BadElfHeader(f"unsupported ELF class {header[EI_CLASS]} / data encoding {header[EI_DATA]}")
+        if len(header) < self.layout.header.size:
+            raise BadElfHeader(f"truncated ELF{self.layout.xlen} header: {len(header)} bytes, "
+                               f"expected {self.layout.header.size}")
+        fields = dict(zip(ElfLayout.HEADER_FIELDS, self.layout.header.unpack_from(header)))
+        self.e_entry = fields["entry"]
+        self.e_shoff = fields["shoff"]
+        self.e_shnum = fields["shnum"]
+        self.e_shentsize = fields["shentsize"]
+        self.e_shstrndx = fields["shstrndx"]
         # print(self.e_shoff, self.e_shnum, self.e_shentsize)
 
     def parse_section_header_table(self):
         arr = []
+        size = self.layout.section.size
+        if self.e_shentsize != size:
+            raise BadSectionHeaderTable(f"e_shentsize is {self.e_shentsize}, expected {size}")
+        table = self.read(self.e_shoff, self.e_shnum * size)
         for i in range(self.e_shnum):
-            ba = self.__arr.get_slice(self.e_shoff + i * self.e_shentsize, self.e_shoff + self.e_shentsize * (i + 1))
-            shc = SectionHeaderElement(ba)
+            shc = SectionHeaderElement(table[i * size:(i + 1) * size], self.layout)
             arr.append(shc)
-            if shc.is_text():
-                self.text_header = shc
-            elif shc.is_symtab():
+            if shc.is_symtab():
                 self.symtab_header = shc
-            elif shc.is_strtab():
-                self.strtab_header = shc
+
+        # .text is the code section named so; without section names, the one holding the entry point. Not only
+        # the latter: in a relocatable object every section is at address 0 and so is the entry point
+        names = self.__section_names(arr)
+        for shc, name in zip(arr, names):
+            if shc.is_code() and name == ".text":
+                self.text_header = shc
+                break
+        else:
+            for shc in arr:
+                if shc.is_code() and (self.text_header is None or shc.contains(self.e_entry)):
+                    self.text_header = shc
+
+        # .strtab is whatever string table .symtab links to
+        if self.symtab_header and self.symtab_header.link < len(arr) and arr[self.symtab_header.link].is_strtab():
+            self.strtab_header = arr[self.symtab_header.link]
 
         if not (self.strtab_header and self.symtab_header and self.text_header):
             print(self.text_header)
@@ -210,63 +450,245 @@ class ElfFile:
             print(self.strtab_header)
             raise BadSectionHeaderTable("\n".join(map(str, arr)))
 
-    def parse_commands(self):
-        def __take(cursor):
-            cursor += COMMAND_SIZE
-            return cursor, self.__arr[cursor - COMMAND_SIZE:cursor]
-
-        def __take_compressed(cursor):
-            cursor += COMPRESSED_COMMAND_SIZE
-            return cursor, self.__arr[cursor - COMPRESSED_COMMAND_SIZE:cursor]
-
-        def __check_compressed():
-            return cmd.is_compressed(self.__arr[cursor:cursor + COMMAND_SIZE])
-
+    def __section_names(self, arr: typing.List[SectionHeaderElement]) -> typing.List[str]:
+        if not 0 < self.e_shstrndx < len(arr) or not arr[self.e_shstrndx].is_strtab():
+            return [""] * len(arr)
+        shstrtab = arr[self.e_shstrndx]
+        # right before the section header table in practice, so a compressed input serves it from the skip cache
+        data = self.read(shstrtab.int_offset(), shstrtab.int_size())
         res = []
-        offset = int.from_bytes(self.text_header.offset, ENDIAN)
-        print(offset)
-        size = int.from_bytes(self.text_header.size, ENDIAN)
+        for shc in arr:
+            end = data.find(b"\x00", shc.int_name())
+            res.append(data[shc.int_name():end if end != -1 else len(data)].decode("utf-8", "replace"))
+        return res
+
+    def iter_text_chunks(self) -> typing.Iterator[typing.Tuple[int, bytes]]:
+        """
+        Streams .text as (file offset, bytes) chunks of TEXT_CHUNK_SIZE, so memory stays bounded by
+        the chunk size (plus SKIP_CACHE_SIZE for compressed inputs) rather than the image size.
+        """
+        offset = self.text_header.int_offset()
+        end = offset + self.text_header.int_size()
         cursor = offset
-        while cursor < offset + size:
-            if __check_compressed():
-                cursor, command = __take_compressed(cursor)
-            else:
-                cursor, command = __take(cursor)
+        while cursor < end:
+            data = self.read(cursor, min(TEXT_CHUNK_SIZE, end - cursor))
+            if not data:
+                break
+            yield cursor, data
+            cursor += len(data)
 
-            res.append((hex(cursor - 4), cmd.parse_line(bin(int.from_bytes(command, "little"))[2:].rjust(COMMAND_SIZE * 8, "0"))))
-        return res
+    def iter_commands(self):
+        for chunk in self.iter_text_chunks():
+            yield from decode_chunk(chunk, self.xlen)
+
+    def parse_commands(self):
+        return list(self.iter_commands())
 
     def parse_symtab(self):
-        cursor = self.symtab_header.int_offset()
+        symtab = self.__read_symtab()
         res = []
-        while cursor < self.symtab_header.int_size() + self.symtab_header.int_offset():
-            el = SymtabElement(self.__arr[cursor:cursor + 16], self.get_name_form_strtab)
+        cursor = 0
+        while cursor < len(symtab):
+            el = SymtabElement(symtab[cursor:cursor + self.layout.symbol.size], self.get_name_form_strtab, self.layout)
             # print(el)
             res.append(el)
-            cursor += 16
+            cursor += self.layout.symbol.size
 
         return res
 
+    def parse_symtab_columns(self) -> SymtabColumns:
+        symtab = self.__read_symtab()
+        return SymtabColumns(symtab, self.__strtab, self.layout)
+
+    def __read_symtab(self):
+        # read .symtab and .strtab in file order so a compressed stream is not rewound in between if they
+        # missed the cache
+        if self.strtab_header.int_offset() < self.symtab_header.int_offset():
+            self.__strtab = self.read(self.strtab_header.int_offset(), self.strtab_header.int_size())
+            return self.read(self.symtab_header.int_offset(), self.symtab_header.int_size())
+        symtab = self.read(self.symtab_header.int_offset(), self.symtab_header.int_size())
+        self.__strtab = self.read(self.strtab_header.int_offset(), self.strtab_header.int_size())
+        return symtab
+
     def get_name_form_strtab(self, start):
-        offset = self.strtab_header.int_offset()
-        size = self.strtab_header.int_size()
-        cursor = start + self.strtab_header.int_offset()
-        w = b""
-        while cursor < offset + size:
-            symbol = self.__arr[cursor]
-            if symbol == b"\x00":
-                break
-            else:
-                w += symbol
-            cursor += 1
-        return w.decode("utf-8")
+        if self.__strtab is None:
+            self.__strtab = self.read(self.strtab_header.int_offset(), self.strtab_header.int_size())
+        end = self.__strtab.find(b"\x00", start)
+        if end == -1:
+            end = len(self.__strtab)
+        return self.__strtab[start:end].decode("utf-8")
+
+
+def decode_chunk(chunk: typing.Tuple[int, bytes], xlen=32, decoder: memo.DecodeMemo = None) \
+        -> typing.List[typing.Tuple[str, str]]:
+    """
+    Decodes one chunk from ElfFile.iter_text_chunks. Module level so it can be shipped to worker processes.
+    TEXT_CHUNK_SIZE is a multiple of COMMAND_SIZE, so no command is split between chunks.
+    `decoder` defaults to the process' memo for `xlen`, see memo.get_memo.
+    """
+
+    def __check_compressed():
+        return cmd.is_compressed(data[pos:pos + COMMAND_SIZE])
+
+    offset, data = chunk
+    decoder = decoder or memo.get_memo(xlen)
+    res = []
+    pos = 0
+    while pos < len(data):
+        size = COMPRESSED_COMMAND_SIZE if __check_compressed() else COMMAND_SIZE
+        command = data[pos:pos + size]
+        pos += size
+
+        res.append((hex(offset + pos - 4), decoder.decode(int.from_bytes(command, COMMAND_ENDIAN))))
+    # pool workers exit without notice, publish their counters while the parent can still read them
+    decoder.flush()
+    return res
+
+
+IndexRecord = namedtuple("IndexRecord", ["address", "word", "mnemonic", "rd", "rs1", "rs2", "imm"])
+IndexSymbol = namedtuple("IndexSymbol", ["value", "size", "name", "info", "other", "shndx"])
+
+
+def export_index(file: ElfFile, path: str):
+    """
+    Writes a DisassemblyIndex of `file`: a fixed-width INDEX_RECORD per command, a table of MNEMONIC_SIZE-byte
+    mnemonics and the symbol table as columns plus .strtab. Record addresses are virtual (sh_addr based) like
+    the symbol values, not the file offsets the text output prints.
+    Everything is little-endian and 8-byte aligned. .text is streamed, the header is written last.
+    """
+    text = file.text_header
+    fields = lru_cache(memo.LOCAL_CAPACITY)(partial(cmd.decode_fields, cmdlist=cmd.CMDLISTS[file.xlen]))
+    mnemonics = {}
+    with open(path, "wb") as out:
+        out.write(bytes(INDEX_HEADER.size))
+        records_offset = _align(out)
+        count = 0
+        for offset, data in file.iter_text_chunks():
+            address = text.address + offset - text.offset
+            records = bytearray()
+            for pos in range(0, len(data), COMMAND_SIZE):
+                word = int.from_bytes(data[pos:pos + COMMAND_SIZE], COMMAND_ENDIAN)
+                name, rd, rs1, rs2, imm = fields(word)
+                mnemonic = mnemonics.setdefault(name, len(mnemonics))
+                records += INDEX_RECORD.pack(address + pos, word, imm, mnemonic, rd, rs1, rs2)
+            out.write(records)
+            count += len(records) // INDEX_RECORD.size
+
+        mnemonics_offset = _align(out)
+        out.write(b"".join(name.encode("utf-8")[:MNEMONIC_SIZE].ljust(MNEMONIC_SIZE, b"\x00") for name in mnemonics))
+
+        columns = file.parse_symtab_columns()
+        column_offsets = []
+        for (_, typecode), values in zip(INDEX_SYMBOL_COLUMNS, [columns.values, columns.sizes, columns.names,
+                                                                   columns.info, columns.other, columns.shndx]):
+            column_offsets.append(_align(out))
+            column = array(typecode, values)
+            if sys.byteorder != "little":
+                column.byteswap()
+            out.write(column.tobytes())
+        strtab_offset = _align(out)
+        out.write(columns.strtab)
+
+        out.seek(0)
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, INDEX_RECORD.size, count, records_offset,
+                                    len(mnemonics), mnemonics_offset, len(columns), *column_offsets,
+                                    len(columns.strtab), strtab_offset))
+
+
+def _align(out) -> int:
+    pos = out.tell()
+    pad = -pos % INDEX_ALIGN
+    out.write(bytes(pad))
+    return pos + pad
+
+
+class DisassemblyIndex:
+    """
+    Read side of export_index. The file is mmap-ed and every record, mnemonic and symbol is
+    read in O(1) straight from the mapping, nothing is parsed up front besides the header.
+    """
+
+    def __init__(self, path: str):
+        self.__file = open(path, "rb")
+        try:
+            self.__mm = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.__file.close()
+            raise BadIndexFile(f"{path} is empty")
+        if len(self.__mm) < INDEX_HEADER.size:
+            self.close()
+            raise BadIndexFile(f"{path} is too short for an index header")
+        magic, version, record_size, *rest = INDEX_HEADER.unpack_from(self.__mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or record_size != INDEX_RECORD.size:
+            self.close()
+            raise BadIndexFile(f"{path}: unsupported index {magic} v{version}")
+        (self.__count, self.__records, self.mnemonic_count, self.__mnemonics, self.symbol_count,
+         *self.__symbol_columns, self.__strtab_size, self.__strtab) = rest
+
+        tables = [("records", self.__records, self.__count * INDEX_RECORD.size),
+                  ("mnemonics", self.__mnemonics, self.mnemonic_count * MNEMONIC_SIZE),
+                  ("strtab", self.__strtab, self.__strtab_size)]
+        tables += [(f"symbol {name}s", offset, self.symbol_count * struct.calcsize(typecode))
+                   for (name, typecode), offset in zip(INDEX_SYMBOL_COLUMNS, self.__symbol_columns)]
+        length = len(self.__mm)
+        for name, offset, size in tables:
+            if offset < INDEX_HEADER.size or offset + size > length:
+                self.close()
+                raise BadIndexFile(f"{path}: {name} [{offset}, {offset + size}) runs past the end of the file "
+                                   f"({length} bytes)")
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, i) -> IndexRecord:
+        if i < 0:
+            i += self.__count
+        if not 0 <= i < self.__count:
+            raise IndexError("index record out of range")
+        address, word, imm, mnemonic, rd, rs1, rs2 = INDEX_RECORD.unpack_from(
+            self.__mm, self.__records + i * INDEX_RECORD.size)
+        return IndexRecord(address, word, self.mnemonic(mnemonic), rd, rs1, rs2, imm)
+
+    def mnemonic(self, i) -> str:
+        if not 0 <= i < self.mnemonic_count:
+            raise IndexError("mnemonic id out of range")
+        start = self.__mnemonics + i * MNEMONIC_SIZE
+        return self.__mm[start:start + MNEMONIC_SIZE].rstrip(b"\x00").decode("utf-8")
+
+    def symbol(self, i) -> IndexSymbol:
+        if i < 0:
+            i += self.symbol_count
+        if not 0 <= i < self.symbol_count:
+            raise IndexError("symbol out of range")
+        value, size, name, info, other, shndx = [
+            struct.unpack_from("<" + typecode, self.__mm, offset + i * struct.calcsize(typecode))[0]
+            for (_, typecode), offset in zip(INDEX_SYMBOL_COLUMNS, self.__symbol_columns)]
+        return IndexSymbol(value, size, self.symbol_name(name), info, other, shndx)
+
+    def symbol_name(self, start) -> str:
+        if start == 0 or start >= self.__strtab_size:
+            return ""
+        end = self.__mm.find(b"\x00", self.__strtab + start, self.__strtab + self.__strtab_size)
+        if end == -1:
+            end = self.__strtab + self.__strtab_size
+        return self.__mm[self.__strtab + start:end].decode("utf-8")
+
+    def close(self):
+        self.__mm.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 def parse(filename: str) -> (typing.List[typing.Tuple], typing.List[SymtabElement]):
-    with open(filename, "rb") as f:
+    with open_input(filename) as f:
         file = ElfFile(f)
         file.parse_header()
         file.parse_section_header_table()
-        symtab = file.parse_symtab()
         cmds = file.parse_commands()
+        symtab = file.parse_symtab()
         return cmds, symtab
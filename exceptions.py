@@ -4,5 +4,14 @@ class UnknownCommandException(Exception):
 
 
 # elf file parse exceptions
+class BadElfHeader(Exception):
+    pass
+
+
 class BadSectionHeaderTable(Exception):
     pass
+
+
+# disassembly index exceptions
+class BadIndexFile(Exception):
+    pass
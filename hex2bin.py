@@ -1,6 +1,8 @@
-with open('test.hex') as h, open('test.bin', 'w') as b:
+from compressed import open_input
+
+with open_input('test.hex', 'r') as h, open('test.bin', 'w') as b:
     f = True
-    for line in h.readlines():
+    for line in h:
         if not f: b.write("\n")
         else: f = False
         line = line.strip().replace(" ", "").replace("\t", "").split(":")[1][:8]
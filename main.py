@@ -1,11 +1,64 @@
 from elf import *
+from pipeline import Pipeline, QUEUE_SIZE
+from functools import partial
+import memo
+import sys
 import typing
 
 
-def main(filename):
-    commands, symtab = parse(filename)
-    print(*commands, sep="\n")
-    print(format_symtab(symtab))
+def main(filename, workers=0, shared_memo: memo.DecodeMemo = None, **query) -> Pipeline:
+    """
+    Prints the disassembled .text followed by the symbol table.
+    `workers` > 0 decodes in that many processes sharing one decode memo.
+    `shared_memo` is passed on to disassemble, so a batch of files can reuse one table.
+    `query` is forwarded to SymtabColumns.query, e.g. main(f, types="FUNC", sort="value").
+    """
+    with open_input(filename) as f:
+        file = ElfFile(f)
+        file.parse_header()
+        file.parse_section_header_table()
+        pipe = disassemble(file, workers=workers, shared_memo=shared_memo)
+        columns = file.parse_symtab_columns()
+        print(format_symbols(columns, columns.query(**query)))
+    return pipe
+
+
+def disassemble(file: ElfFile, out=None, workers=0, queue_size=QUEUE_SIZE,
+                shared_memo: memo.DecodeMemo = None) -> Pipeline:
+    """
+    Streams .text through reader -> decoder -> writer stages and writes the commands to `out` (stdout by default).
+    Returns the finished pipeline, see Pipeline.metrics() for per-stage throughput, queue depths and memo counters.
+
+    Words are decoded through `shared_memo` when given, also without workers; it is left open so the next
+    call (or another process) reuses what this one decoded, e.g.
+    `shared = memo.DecodeMemo.create(); for f in files: disassemble(f, workers=4, shared_memo=shared)`.
+    Otherwise `workers` > 0 uses a table created for this call and unlinked at the end.
+    """
+    out = out or sys.stdout
+    shared = shared_memo
+    if shared is not None and shared.xlen != file.xlen:
+        raise ValueError(f"decode memo is for RV{shared.xlen}, the image is {file.xlen}-bit")
+    owned = shared is None and workers > 0
+    if owned:
+        shared = memo.DecodeMemo.create(xlen=file.xlen)
+    decode = partial(decode_chunk, xlen=file.xlen)
+    if shared is not None and not workers:
+        decode = partial(decode_chunk, xlen=file.xlen, decoder=shared)
+    # .text's file offset heads the listing
+    out.write(f"{file.text_header.int_offset()}\n")
+    try:
+        pipe = Pipeline(file.iter_text_chunks(), decode, lambda commands: out.write(format_commands(commands)),
+                        queue_size=queue_size, workers=workers, shared_memo=shared)
+        pipe.run()
+    finally:
+        if owned:
+            shared.close()
+            shared.unlink()
+    return pipe
+
+
+def format_commands(commands: typing.List[typing.Tuple]):
+    return "".join([str(command) + "\n" for command in commands])
 
 
 def format_symtab(symtab: typing.List[SymtabElement]):
@@ -19,5 +72,11 @@ def format_symtab(symtab: typing.List[SymtabElement]):
     return res
 
 
+def format_symbols(columns: SymtabColumns, rows: typing.Iterable[int]):
+    row_f = "[%4i] 0x%-15X %5i %-8s %-8s %-8s %6s %s\n"
+    # noinspection PyStringFormat
+    return "".join([row_f % (i, *columns.as_list(i)) for i in rows])
+
+
 if __name__ == '__main__':
     main("test.elf")
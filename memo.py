@@ -0,0 +1,283 @@
+import multiprocessing
+import struct
+import typing
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import commands as cmd
+
+COMMAND_BITS = 32
+LOCAL_CAPACITY = 4096
+SHARED_SLOTS = 1 << 14
+SHARED_WAYS = 4
+SHARED_TEXT_SIZE = 48
+U32_MASK = 0xffffffff
+
+MAGIC = b"RVDM"
+HEADER = struct.Struct("<4sIII")  # magic, slots, ways, xlen
+COUNTERS = struct.Struct("<QQQQ")  # hits, shared hits, misses, evictions of every attached process
+COUNTERS_OFFSET = HEADER.size
+COUNTER_NAMES = ["hits", "shared_hits", "misses", "evictions"]
+HEADER_SIZE = 64
+SLOT = struct.Struct("<IIIH2x")  # seq, word, frequency, text length
+SLOT_SIZE = SLOT.size + SHARED_TEXT_SIZE
+FREQUENCY = struct.Struct("<I")
+FREQUENCY_OFFSET = 8
+
+
+class DecodeMemo:
+    """
+    word -> decoded instruction memo.
+
+    Lookups go to a process-local LRU first, then (if attached) to a set-associative table in
+    `multiprocessing.shared_memory`, so every pool worker on the machine decodes a given encoding once.
+    Shared slots are evicted by lowest hit frequency; frequencies in a bucket are halved on every
+    eviction so stale hot words age out. Writers are serialized by `lock`. Readers don't lock to copy a
+    slot, they validate it with its sequence number (odd while a write is in progress); only the
+    frequency bump after a shared hit takes the lock, so it can't land on a slot a writer just refilled.
+
+    Hit/miss/eviction counters are kept per process and added to totals in the shared header whenever the
+    lock is taken anyway, and on flush(), so stats() of any attachment covers every process using the table.
+    """
+
+    def __init__(self, capacity=LOCAL_CAPACITY, shm: shared_memory.SharedMemory = None, lock=None, xlen=32):
+        self.capacity = capacity
+        self.lock = lock
+        self.xlen = xlen
+        self.__local = OrderedDict()
+        self.__shm = shm
+        self.__buf = None
+        self.__buckets = 0
+        self.__shift = 0
+        self.__ways = 0
+        if shm is not None:
+            magic, slots, ways, self.xlen = HEADER.unpack_from(shm.buf, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{shm.name} is not a decode memo")
+            self.__buf = shm.buf
+            self.__ways = ways
+            self.__buckets = slots // ways
+            if self.__buckets & (self.__buckets - 1):
+                raise ValueError(f"{shm.name}: bucket count {self.__buckets} is not a power of two")
+            # bucket = top log2(buckets) bits of the multiplicative hash
+            self.__shift = 32 - (self.__buckets.bit_length() - 1)
+
+        self.__cmdlist = cmd.CMDLISTS[self.xlen]
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # counter values already added to the shared header, and its totals as of the last read
+        self.__flushed = (0, 0, 0, 0)
+        self.__totals = None
+
+    @classmethod
+    def create(cls, slots=SHARED_SLOTS, capacity=LOCAL_CAPACITY, ways=SHARED_WAYS, name=None, xlen=32):
+        # power-of-two bucket count, see __bucket
+        buckets = max(slots // ways, 1)
+        slots = (1 << (buckets.bit_length() - 1)) * ways
+        shm = shared_memory.SharedMemory(name, create=True, size=HEADER_SIZE + slots * SLOT_SIZE)
+        shm.buf[:] = bytes(shm.size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, slots, ways, xlen)
+        return cls(capacity, shm, pool_context().Lock())
+
+    @classmethod
+    def attach(cls, name, lock=None, capacity=LOCAL_CAPACITY):
+        return cls(capacity, shared_memory.SharedMemory(name), lock)
+
+    @property
+    def name(self) -> typing.Optional[str]:
+        return self.__shm.name if self.__shm is not None else None
+
+    def decode(self, word: int) -> str:
+        res = self.get(word)
+        if res is None:
+            self.misses += 1
+            res = cmd.parse_line(bin(word)[2:].rjust(COMMAND_BITS, "0"), self.__cmdlist)
+            self.put(word, res)
+        return res
+
+    def get(self, word: int) -> typing.Optional[str]:
+        res = self.__local.get(word)
+        if res is not None:
+            self.__local.move_to_end(word)
+            self.hits += 1
+            return res
+        if self.__buf is None:
+            return None
+        res = self.__shared_get(word)
+        if res is not None:
+            self.shared_hits += 1
+            self.__local_put(word, res)
+        return res
+
+    def put(self, word: int, text: str):
+        self.__local_put(word, text)
+        if self.__buf is not None:
+            self.__shared_put(word, text)
+
+    def stats(self) -> typing.Dict:
+        """
+        Lookup counters. For a shared table they are the totals of every process attached to it (as of their
+        last flush), and still readable after close().
+        """
+        if self.__buf is not None:
+            self.flush()
+            self.__totals = COUNTERS.unpack_from(self.__buf, COUNTERS_OFFSET)
+        if self.__totals is not None:
+            hits, shared_hits, misses, evictions = self.__totals
+        else:
+            hits, shared_hits, misses, evictions = self.__counters()
+        lookups = hits + shared_hits + misses
+        return {
+            "hits": hits,
+            "shared_hits": shared_hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": (hits + shared_hits) / lookups if lookups else 0.0,
+            "local_size": len(self.__local),
+        }
+
+    def flush(self):
+        """Adds this process' counters to the shared totals, see stats()."""
+        if self.__buf is None or self.__counters() == self.__flushed:
+            return
+        if self.lock is not None:
+            self.lock.acquire()
+        try:
+            self.__flush_counters()
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def view(self) -> typing.Optional[memoryview]:
+        """Read-only view of the shared table, header included; None if not attached."""
+        return self.__buf.toreadonly() if self.__buf is not None else None
+
+    def close(self):
+        if self.__shm is not None and self.__buf is not None:
+            self.stats()
+            self.__buf = None
+            self.__shm.close()
+
+    def unlink(self):
+        if self.__shm is not None:
+            self.__shm.unlink()
+
+    def __counters(self):
+        return self.hits, self.shared_hits, self.misses, self.evictions
+
+    def __flush_counters(self):
+        # caller holds the lock
+        counters = self.__counters()
+        totals = COUNTERS.unpack_from(self.__buf, COUNTERS_OFFSET)
+        COUNTERS.pack_into(self.__buf, COUNTERS_OFFSET,
+                           *(total + new - old for total, new, old in zip(totals, counters, self.__flushed)))
+        self.__flushed = counters
+
+    def __local_put(self, word, text):
+        self.__local[word] = text
+        self.__local.move_to_end(word)
+        if len(self.__local) > self.capacity:
+            self.__local.popitem(last=False)
+
+    def __bucket(self, word):
+        # the low bits of a multiplicative hash only depend on the low bits of the word (opcode and rd),
+        # the high ones mix in the whole encoding
+        return HEADER_SIZE + (((word * 2654435761) & U32_MASK) >> self.__shift) * self.__ways * SLOT_SIZE
+
+    def __shared_get(self, word):
+        buf = self.__buf
+        off = self.__bucket(word)
+        for _ in range(self.__ways):
+            seq, key, frequency, length = SLOT.unpack_from(buf, off)
+            if frequency and key == word and not seq & 1:
+                text = bytes(buf[off + SLOT.size:off + SLOT.size + length])
+                if SLOT.unpack_from(buf, off)[0] != seq:
+                    return None
+                self.__bump(off, seq, word)
+                return text.decode("utf-8")
+            off += SLOT_SIZE
+        return None
+
+    def __bump(self, off, seq, word):
+        buf = self.__buf
+        if self.lock is not None:
+            self.lock.acquire()
+        try:
+            current_seq, key, frequency, _ = SLOT.unpack_from(buf, off)
+            # the slot may have been refilled since it was read, its new entry starts at frequency 1
+            if current_seq == seq and key == word:
+                FREQUENCY.pack_into(buf, off + FREQUENCY_OFFSET, min(frequency + 1, U32_MASK))
+            self.__flush_counters()
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def __shared_put(self, word, text):
+        data = text.encode("utf-8")
+        if len(data) > SHARED_TEXT_SIZE:
+            return
+        buf = self.__buf
+        if self.lock is not None:
+            self.lock.acquire()
+        try:
+            base = self.__bucket(word)
+            victim = None
+            victim_frequency = None
+            for i in range(self.__ways):
+                off = base + i * SLOT_SIZE
+                _, key, frequency, _ = SLOT.unpack_from(buf, off)
+                if frequency and key == word:
+                    return
+                if victim is None or frequency < victim_frequency:
+                    victim, victim_frequency = off, frequency
+            if victim_frequency:
+                self.evictions += 1
+                for i in range(self.__ways):
+                    off = base + i * SLOT_SIZE
+                    frequency = FREQUENCY.unpack_from(buf, off + FREQUENCY_OFFSET)[0]
+                    FREQUENCY.pack_into(buf, off + FREQUENCY_OFFSET, max(frequency >> 1, 1))
+
+            seq = SLOT.unpack_from(buf, victim)[0]
+            SLOT.pack_into(buf, victim, (seq + 1) & U32_MASK, word, 1, len(data))
+            buf[victim + SLOT.size:victim + SLOT.size + len(data)] = data
+            SLOT.pack_into(buf, victim, (seq + 2) & U32_MASK, word, 1, len(data))
+            self.__flush_counters()
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+
+def pool_context():
+    """
+    multiprocessing context for worker pools and the locks they share: forkserver, or spawn where that's
+    unavailable. Pools are started from threaded code (see pipeline.Pipeline), where fork can deadlock.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+# one memo per XLEN: the same word decodes differently in RV32 and RV64
+_memos = {}
+
+
+def get_memo(xlen=32) -> DecodeMemo:
+    res = _memos.get(xlen)
+    if res is None:
+        res = _memos[xlen] = DecodeMemo(xlen=xlen)
+    return res
+
+
+def set_memo(memo: DecodeMemo):
+    _memos[memo.xlen] = memo
+
+
+def init_worker(name, lock=None):
+    """
+    Pool initializer: makes the worker decode through the shared memo created by the parent, e.g.
+    `Pool(initializer=memo.init_worker, initargs=(shared.name, shared.lock))`.
+    """
+    set_memo(DecodeMemo.attach(name, lock))
+
@@ -1,13 +1,14 @@
-import commands
+import memo
+from compressed import open_input
 
 
-with open("test.bin") as inp:
+with open_input("test.bin", "r") as inp:
     def _reverse_line(line):
         return line[::-1]
 
-    for line in inp.readlines():
+    for line in inp:
         line = line.strip()
-        print(commands.parse_line(line))
+        print(memo.get_memo().decode(int(line, 2)))
 
     # for line in inp.readlines():
     #     line = line.strip().replace(" ", "").split(":")[1][:9]
@@ -0,0 +1,223 @@
+import queue
+import threading
+import time
+import typing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import memo
+
+QUEUE_SIZE = 8
+PUT_TIMEOUT = 0.1
+_DONE = object()
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.started = None
+        self.finished = None
+
+    def wall(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def as_dict(self) -> typing.Dict:
+        wall = self.wall()
+        return {
+            "items": self.items,
+            "busy": self.busy,
+            "blocked": self.blocked,
+            "wall": wall,
+            "throughput": self.items / wall if wall else 0.0,
+        }
+
+
+class BoundedQueue:
+    """queue.Queue that records its depth on every put."""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize)
+        self.puts = 0
+        self.max_depth = 0
+        self.total_depth = 0
+
+    def put(self, item, timeout):
+        self.queue.put(item, timeout=timeout)
+        depth = self.queue.qsize()
+        self.puts += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+    def as_dict(self) -> typing.Dict:
+        return {
+            "maxsize": self.maxsize,
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "mean_depth": self.total_depth / self.puts if self.puts else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    reader -> decoder -> writer, each stage in its own thread, connected by bounded queues.
+
+    `source` is iterated by the reader, `decode` maps one source item to a decoded item and `write`
+    consumes decoded items in source order. A full queue blocks the stage in front of it, so a slow
+    writer throttles decoding and reading and memory stays flat.
+
+    With `workers` > 0 `decode` runs in a process pool (it must be picklable); at most `queue_size`
+    items are in flight, and workers decode through the shared memo when `shared_memo` is given.
+    The pool is created before the stage threads start, and by default from memo.pool_context() so its workers
+    aren't forked from this process: forking while other threads hold locks can deadlock the child.
+    """
+
+    def __init__(self, source: typing.Iterable, decode: typing.Callable, write: typing.Callable,
+                 queue_size=QUEUE_SIZE, workers=0, shared_memo: memo.DecodeMemo = None, mp_context=None):
+        self.source = source
+        self.decode = decode
+        self.write = write
+        self.queue_size = queue_size
+        self.workers = workers
+        self.shared_memo = shared_memo
+        self.mp_context = mp_context
+
+        self.__stages = dict((name, StageMetrics(name)) for name in ["reader", "decoder", "writer"])
+        self.__queues = [BoundedQueue("chunks", queue_size), BoundedQueue("decoded", queue_size)]
+        self.__failed = threading.Event()
+        self.__error = None
+
+    def run(self):
+        chunks, decoded = self.__queues
+        pool = self.__create_pool() if self.workers else None
+        try:
+            threads = [
+                threading.Thread(target=self.__stage, args=("reader", self.__read, chunks), daemon=True),
+                threading.Thread(target=self.__stage, args=("decoder", self.__decode, chunks, decoded, pool),
+                                 daemon=True),
+                threading.Thread(target=self.__stage, args=("writer", self.__write, decoded), daemon=True),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        if self.__error is not None:
+            raise self.__error
+
+    def metrics(self) -> typing.Dict:
+        res = {
+            "stages": dict((name, stage.as_dict()) for name, stage in self.__stages.items()),
+            "queues": dict((q.name, q.as_dict()) for q in self.__queues),
+        }
+        if self.shared_memo is not None:
+            res["memo"] = self.shared_memo.stats()
+        return res
+
+    def __stage(self, name, target, *args):
+        stage = self.__stages[name]
+        stage.started = time.perf_counter()
+        try:
+            target(stage, *args)
+        except BaseException as e:
+            if self.__error is None:
+                self.__error = e
+            self.__failed.set()
+        finally:
+            stage.finished = time.perf_counter()
+
+    def __put(self, stage, q: BoundedQueue, item):
+        start = time.perf_counter()
+        while True:
+            if self.__failed.is_set():
+                raise _Cancelled()
+            try:
+                q.put(item, PUT_TIMEOUT)
+                break
+            except queue.Full:
+                pass
+        stage.blocked += time.perf_counter() - start
+
+    def __get(self, q: BoundedQueue):
+        while True:
+            if self.__failed.is_set():
+                raise _Cancelled()
+            try:
+                return q.get(PUT_TIMEOUT)
+            except queue.Empty:
+                pass
+
+    def __iter_queue(self, q: BoundedQueue):
+        item = self.__get(q)
+        while item is not _DONE:
+            yield item
+            item = self.__get(q)
+
+    def __read(self, stage, out):
+        it = iter(self.source)
+        while True:
+            start = time.perf_counter()
+            item = next(it, _DONE)
+            stage.busy += time.perf_counter() - start
+            if item is _DONE:
+                break
+            stage.items += 1
+            self.__put(stage, out, item)
+        self.__put(stage, out, _DONE)
+
+    def __create_pool(self) -> ProcessPoolExecutor:
+        context = self.mp_context or memo.pool_context()
+        initializer, initargs = None, ()
+        if self.shared_memo is not None:
+            initializer, initargs = memo.init_worker, (self.shared_memo.name, self.shared_memo.lock)
+        return ProcessPoolExecutor(self.workers, mp_context=context, initializer=initializer, initargs=initargs)
+
+    def __decode(self, stage, inp, out, pool):
+        if pool is None:
+            for item in self.__iter_queue(inp):
+                start = time.perf_counter()
+                res = self.decode(item)
+                stage.busy += time.perf_counter() - start
+                stage.items += 1
+                self.__put(stage, out, res)
+            self.__put(stage, out, _DONE)
+            return
+
+        pending = deque()
+        for item in self.__iter_queue(inp):
+            pending.append(pool.submit(self.decode, item))
+            if len(pending) >= self.queue_size:
+                self.__collect(stage, pending.popleft(), out)
+        while pending:
+            self.__collect(stage, pending.popleft(), out)
+        self.__put(stage, out, _DONE)
+
+    def __collect(self, stage, future, out):
+        start = time.perf_counter()
+        res = future.result()
+        # busy is time spent waiting on workers here, i.e. the part of decoding the pool didn't hide
+        stage.busy += time.perf_counter() - start
+        stage.items += 1
+        self.__put(stage, out, res)
+
+    def __write(self, stage, inp):
+        for item in self.__iter_queue(inp):
+            start = time.perf_counter()
+            self.write(item)
+            stage.busy += time.perf_counter() - start
+            stage.items += 1
+
+
+class _Cancelled(Exception):
+    pass
@@ -0,0 +1,38 @@
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+import elf
+
+
+class RewindCountingFile(gzip.GzipFile):
+    rewinds = 0
+
+    def seek(self, offset, whence=0):
+        if whence == 0 and offset < self.tell():
+            self.rewinds += 1
+        return super().seek(offset, whence)
+
+
+def parse(file: elf.ElfFile):
+    return file.parse_commands(), [str(el) for el in file.parse_symtab()]
+
+
+@pytest.mark.parametrize("compress, suffix", [(gzip.compress, "gz"), (lzma.compress, "xz"), (bz2.compress, "bz2")])
+def test_compressed_input_parses_like_plain(tmp_path, elf_file, compress, suffix):
+    path = tmp_path / f"test.elf.{suffix}"
+    with open("test.elf", "rb") as f:
+        path.write_bytes(compress(f.read()))
+    assert parse(elf_file(path)) == parse(elf_file("test.elf"))
+
+
+def test_sections_are_served_from_the_skip_cache(tmp_path, elf_file):
+    path = tmp_path / "test.elf.gz"
+    with open("test.elf", "rb") as f:
+        path.write_bytes(gzip.compress(f.read()))
+    with RewindCountingFile(str(path), "rb") as f:
+        parse(elf_file(f))
+        # the whole image fits in the cache, only the initial skip to the section header table decompresses
+        assert f.rewinds == 0
@@ -0,0 +1,182 @@
+import struct
+
+import pytest
+
+import commands as cmd
+import elf
+
+TEXT_ADDRESS = 0x10000
+RV64_WORDS = [
+    (0x00053503, "ld a0, 0(a0)"),
+    (0x00a53023, "sd a0, 0x0(a0)"),
+    (0x0015051b, "addiw a0, a0, 1"),
+    (0x40b5053b, "subw a0, a0, a1"),
+    (0x02151513, "slli a0, a0, 33"),
+    (0x03f51513, "slli a0, a0, 63"),
+    (0x43f55513, "srai a0, a0, 63"),
+    (0x02b5053b, "mulw a0, a0, a1"),
+    (0x4015d59b, "sraiw a1, a1, 1"),
+    (0x00f50513, "addi a0, a0, 15"),
+    (0x00008067, "jalr zero, 0(ra)"),
+]
+# name offset, value, size, info, other, shndx
+SYMBOLS = [
+    (0, 0, 0, 0, 0, 0),
+    (1, TEXT_ADDRESS, 4 * len(RV64_WORDS), 0x12, 0, 2),  # main: GLOBAL FUNC in .text
+    (6, TEXT_ADDRESS + 8, 8, 0x02, 0, 2),  # helper: LOCAL FUNC in .text
+    (13, 0x20000, 8, 0x11, 0, 1),  # table: GLOBAL OBJECT in .data
+    (0, 0, 0, 0x04, 0, 0xfff1),  # FILE, ABS
+]
+
+
+def build_elf(xlen, endian, words, relocatable=False, shstrndx=5) -> bytes:
+    """
+    Minimal image: .data, .text, .symtab, .strtab, .shstrtab, then the section header table.
+    `relocatable` makes it an ET_REL object: every address and the entry point are 0, and a .text.exit
+    code section follows .text.
+    """
+    order = "<" if endian == "little" else ">"
+    word = "I" if xlen == 32 else "Q"
+    ehsize, shentsize, symentsize = (52, 40, 16) if xlen == 32 else (64, 64, 24)
+
+    text = b"".join(w.to_bytes(elf.COMMAND_SIZE, elf.COMMAND_ENDIAN) for w in words)
+    strtab = b"\x00main\x00helper\x00table\x00"
+    if xlen == 32:
+        symtab = b"".join(struct.pack(order + "IIIBBH", *sym) for sym in SYMBOLS)
+    else:
+        symtab = b"".join(struct.pack(order + "IBBHQQ", n, i, o, sh, v, s) for n, v, s, i, o, sh in SYMBOLS)
+    shstrtab = b"\x00.text\x00.symtab\x00.strtab\x00.shstrtab\x00.data\x00.text.exit\x00"
+    base = 0 if relocatable else TEXT_ADDRESS
+
+    body = b""
+    offsets = []
+    for data in (b"\x13\x00\x00\x00" * 2, text, symtab, strtab, shstrtab, b"\x67\x80\x00\x00"):
+        body += bytes(-(ehsize + len(body)) % 8)
+        offsets.append(ehsize + len(body))
+        body += data
+    body += bytes(-(ehsize + len(body)) % 8)
+    shoff = ehsize + len(body)
+
+    def section(name, kind, flags, address, index, size, link=0, entsize=0):
+        return struct.pack(order + "II" + word * 4 + "II" + word * 2,
+                           name, kind, flags, address, offsets[index], size, link, 0, 4, entsize)
+
+    sections = [
+        bytes(shentsize),
+        section(33, elf.SHTConsts.TYPE_PROGBITS, 3, 0 if relocatable else 0x20000, 0, 8),
+        section(1, elf.SHTConsts.TYPE_PROGBITS, 6, base, 1, len(text)),
+        section(7, elf.SHTConsts.TYPE_SYMTAB, 0, 0, 2, len(symtab), link=4, entsize=symentsize),
+        section(15, elf.SHTConsts.TYPE_STRTAB, 0, 0, 3, len(strtab)),
+        section(23, elf.SHTConsts.TYPE_STRTAB, 0, 0, 4, len(shstrtab)),
+    ]
+    if relocatable:
+        sections.append(section(39, elf.SHTConsts.TYPE_PROGBITS, 6, 0, 5, 4))
+    ident = elf.ELF_MAGIC + bytes([elf.ELFCLASS32 if xlen == 32 else elf.ELFCLASS64,
+                                   elf.ELFDATA2LSB if endian == "little" else elf.ELFDATA2MSB, 1]) + bytes(9)
+    header = ident + struct.pack(order + "HHI" + word * 3 + "IHHHHHH", 1 if relocatable else 2, 243, 1, base, 0,
+                                 shoff, 0, ehsize, 0, 0, shentsize, len(sections), shstrndx)
+    return header + body + b"".join(sections)
+
+
+@pytest.fixture(params=[(32, "little"), (32, "big"), (64, "little"), (64, "big")], ids=lambda p: f"{p[0]}{p[1][0]}")
+def image(request, tmp_path, elf_file):
+    xlen, endian = request.param
+    path = tmp_path / f"rv{xlen}{endian[0]}.elf"
+    path.write_bytes(build_elf(xlen, endian, [w for w, _ in RV64_WORDS]))
+    return xlen, endian, elf_file(path)
+
+
+def test_layout_and_sections(image):
+    xlen, endian, file = image
+    assert (file.xlen, file.layout.endian, file.e_entry) == (xlen, endian, TEXT_ADDRESS)
+    assert (file.text_header.address, file.text_header.size) == (TEXT_ADDRESS, 4 * len(RV64_WORDS))
+    assert file.symtab_header.link == 4
+
+
+@pytest.mark.parametrize("xlen", [32, 64])
+def test_text_is_found_by_name_in_relocatable_objects(tmp_path, elf_file, xlen):
+    path = tmp_path / "object.o"
+    path.write_bytes(build_elf(xlen, "little", [w for w, _ in RV64_WORDS], relocatable=True))
+    file = elf_file(path)
+    # .text.exit also holds the entry point 0 and comes later in the table
+    assert (file.e_entry, file.text_header.address) == (0, 0)
+    assert file.text_header.size == 4 * len(RV64_WORDS)
+
+
+def test_text_falls_back_to_the_entry_point_without_section_names(tmp_path, elf_file):
+    path = tmp_path / "stripped.elf"
+    path.write_bytes(build_elf(64, "little", [w for w, _ in RV64_WORDS], shstrndx=0))
+    assert elf_file(path).text_header.address == TEXT_ADDRESS
+
+
+def test_decodes_rv64i_only_from_elf64(image):
+    xlen, _, file = image
+    decoded = [text for _, text in file.parse_commands()]
+    if xlen == 64:
+        assert decoded == [text for _, text in RV64_WORDS]
+    else:
+        # shamt is 5 bits and the W/doubleword opcodes don't exist in RV32I
+        assert decoded[-2:] == ["addi a0, a0, 15", "jalr zero, 0(ra)"]
+        assert all(text.startswith("unknown") for text in decoded[:-2])
+
+
+def test_symbols(image):
+    _, _, file = image
+    symtab = file.parse_symtab()
+    assert [(el.name, el.value, el.size, el.info, el.shndx) for el in symtab[1:4]] == [
+        ("main", TEXT_ADDRESS, 4 * len(RV64_WORDS), 0x12, "2"),
+        ("helper", TEXT_ADDRESS + 8, 8, 0x02, "2"),
+        ("table", 0x20000, 8, 0x11, "1"),
+    ]
+
+    columns = file.parse_symtab_columns()
+    assert list(columns.values) == [sym[1] for sym in SYMBOLS]
+    assert list(columns.shndx) == [sym[5] for sym in SYMBOLS]
+    assert columns.query(types="FUNC") == [1, 2]
+    assert columns.query(bindings="GLOBAL", sort="value", reverse=True) == [3, 1]
+    assert columns.query(shndx=2, prefix="he") == [2]
+    assert columns.query(shndx="ABS") == [4]
+    assert columns.query(top=1) == [1]
+
+
+def test_rv64_shift_immediates():
+    # the rs2 field holds the low bits of shamt
+    assert cmd.decode_fields(0x43f55513, cmd.CMDLIST64) == ("srai", 10, 10, 31, 63)
+    assert cmd.decode_fields(0x02151513, cmd.CMDLIST64) == ("slli", 10, 10, 1, 33)
+    assert cmd.decode_fields(0x4015d59b, cmd.CMDLIST64) == ("sraiw", 11, 11, 1, 1)
+    assert cmd.decode_fields(0x02151513, cmd.CMDLIST)[0] == "unknown"
+
+
+def test_index_round_trip(image, tmp_path):
+    xlen, _, file = image
+    path = str(tmp_path / "image.idx")
+    elf.export_index(file, path)
+    cmdlist = cmd.CMDLISTS[xlen]
+    with elf.DisassemblyIndex(path) as index:
+        assert [index[i] for i in range(len(index))] == [
+            elf.IndexRecord(TEXT_ADDRESS + 4 * i, word, *cmd.decode_fields(word, cmdlist))
+            for i, (word, _) in enumerate(RV64_WORDS)]
+        assert [(index.symbol(i).name, index.symbol(i).shndx) for i in range(1, index.symbol_count)] == [
+            ("main", 2), ("helper", 2), ("table", 1), ("", 0xfff1)]
+
+
+@pytest.mark.parametrize("ident", [
+    b"\x7fELF\x03\x01",  # no such class
+    b"\x7fELF\x01\x03",  # no such data encoding
+    b"MZ\x90\x00\x03\x00",
+])
+def test_rejects_unsupported_headers(tmp_path, ident):
+    path = tmp_path / "bad.elf"
+    path.write_bytes(ident + build_elf(64, "little", [])[len(ident):])
+    with open(path, "rb") as f:
+        with pytest.raises(elf.BadElfHeader, match="not an ELF file|unsupported"):
+            elf.ElfFile(f).parse_header()
+
+
+@pytest.mark.parametrize("xlen, length", [(64, 40), (32, 51), (64, 5)])
+def test_rejects_truncated_header(tmp_path, xlen, length):
+    path = tmp_path / "short.elf"
+    path.write_bytes(build_elf(xlen, "little", [])[:length])
+    with open(path, "rb") as f:
+        with pytest.raises(elf.BadElfHeader, match="truncated"):
+            elf.ElfFile(f).parse_header()
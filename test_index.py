@@ -0,0 +1,77 @@
+import pytest
+
+import commands as cmd
+import elf
+
+
+@pytest.fixture
+def index(tmp_path, elf_file):
+    path = tmp_path / "test.idx"
+    elf.export_index(elf_file("test.elf"), str(path))
+    with elf.DisassemblyIndex(str(path)) as res:
+        yield res
+
+
+def test_records_are_fixed_width_and_aligned(index, tmp_path):
+    assert elf.INDEX_RECORD.size == 24
+    header = elf.INDEX_HEADER.unpack((tmp_path / "test.idx").read_bytes()[:elf.INDEX_HEADER.size])
+    records_offset = header[4]
+    assert records_offset % 8 == 0
+
+
+def test_records_round_trip(index, elf_file):
+    file = elf_file("test.elf")
+    text = file.text_header
+    data = file.read(text.offset, text.size)
+
+    assert len(index) == text.size // elf.COMMAND_SIZE
+    for i in range(len(index)):
+        word = int.from_bytes(data[i * 4:i * 4 + 4], "little")
+        name, rd, rs1, rs2, imm = cmd.decode_fields(word)
+        assert index[i] == elf.IndexRecord(text.address + i * 4, word, name, rd, rs1, rs2, imm)
+
+
+def test_record_fields(index):
+    assert index[0] == elf.IndexRecord(0x10074, 0x00000793, "addi", 15, 0, 0, 0)
+    assert index[-1] == index[len(index) - 1]
+    with pytest.raises(IndexError):
+        index[len(index)]
+
+
+def test_symbols_map_to_their_instructions(index):
+    names = dict((index.symbol(i).name, index.symbol(i)) for i in range(index.symbol_count))
+    main = names["main"]
+    assert (main.value, main.size, main.info, main.shndx) == (0x10144, 108, 0x12, 1)
+
+    first = (main.value - index[0].address) // elf.COMMAND_SIZE
+    assert index[first] == elf.IndexRecord(0x10144, 0xfe010113, "addi", 2, 2, 0, -32)
+    # blt a4, a5, 0x1016c
+    blt = index[first + (0x10198 - 0x10144) // elf.COMMAND_SIZE]
+    assert (blt.mnemonic, blt.rs1, blt.rs2, blt.address + blt.imm) == ("blt", 14, 15, 0x1016c)
+
+
+def test_symbol_columns_round_trip(index, elf_file):
+    symtab = elf_file("test.elf").parse_symtab()
+    assert index.symbol_count == len(symtab)
+    for i, el in enumerate(symtab):
+        symbol = index.symbol(i)
+        assert (symbol.value, symbol.size, symbol.name) == (el.value, el.size, el.name)
+        assert (symbol.info, symbol.other) == (el.info, el.other)
+
+
+def test_rejects_foreign_files():
+    with pytest.raises(elf.BadIndexFile):
+        elf.DisassemblyIndex("test.elf")
+
+
+@pytest.mark.parametrize("keep", [0, 100, 0.3, 0.9, -1])
+def test_rejects_truncated_files(index, tmp_path, keep):
+    data = (tmp_path / "test.idx").read_bytes()
+    if isinstance(keep, float):
+        keep = int(len(data) * keep)
+    elif keep < 0:
+        keep = len(data) + keep
+    truncated = tmp_path / "truncated.idx"
+    truncated.write_bytes(data[:keep])
+    with pytest.raises(elf.BadIndexFile):
+        elf.DisassemblyIndex(str(truncated))
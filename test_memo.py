@@ -0,0 +1,158 @@
+import io
+import struct
+from multiprocessing import shared_memory
+
+import pytest
+
+import elf
+import main
+import memo
+
+
+def text_words(file: elf.ElfFile):
+    words = set()
+    for _, data in file.iter_text_chunks():
+        words.update(int.from_bytes(data[i:i + elf.COMMAND_SIZE], "little")
+                     for i in range(0, len(data), elf.COMMAND_SIZE))
+    return words
+
+
+@pytest.fixture
+def shared():
+    created = []
+
+    def _create(*args, **kwargs):
+        res = memo.DecodeMemo.create(*args, **kwargs)
+        created.append(res)
+        return res
+
+    yield _create
+    for res in created:
+        res.close()
+        res.unlink()
+
+
+def slot_of(shared_memo, word):
+    buf = shared_memo.view()
+    for off in range(memo.HEADER_SIZE, len(buf) - memo.SLOT_SIZE + 1, memo.SLOT_SIZE):
+        _, key, frequency, _ = memo.SLOT.unpack_from(buf, off)
+        if frequency and key == word:
+            return off
+    return None
+
+
+@pytest.mark.parametrize("slots, retained", [(memo.SHARED_SLOTS, 0.99), (1 << 12, 0.9)])
+def test_shared_table_retains_real_text(shared, elf_file, slots, retained):
+    words = text_words(elf_file("test2.elf"))
+    table = shared(slots=slots)
+    for word in words:
+        table.decode(word)
+
+    # a fresh attachment has an empty local LRU, so every hit comes from the shared table
+    reader = memo.DecodeMemo.attach(table.name, table.lock)
+    try:
+        kept = sum(reader.get(word) is not None for word in words)
+    finally:
+        reader.close()
+    assert kept / len(words) >= retained
+
+
+def test_create_rounds_buckets_to_power_of_two(shared):
+    table = shared(slots=100, ways=4)
+    _, slots, ways, _ = memo.HEADER.unpack_from(table.view(), 0)
+    assert (slots, ways) == (64, 4)
+
+
+def test_shared_hit_decodes_like_parse_line(shared):
+    table = shared()
+    assert table.decode(0x00000793) == "addi a5, zero, 0"
+    reader = memo.DecodeMemo.attach(table.name, table.lock)
+    try:
+        assert reader.get(0x00000793) == "addi a5, zero, 0"
+        assert reader.stats()["shared_hits"] == 1
+    finally:
+        reader.close()
+
+
+def test_slot_being_written_is_not_read(shared):
+    table = shared()
+    table.put(0x13, "addi zero, zero, 0")
+    off = slot_of(table, 0x13)
+    seq = memo.SLOT.unpack_from(table.view(), off)[0]
+
+    # play a writer through a raw mapping of the table
+    writer = shared_memory.SharedMemory(table.name)
+    reader = memo.DecodeMemo.attach(table.name, table.lock)
+    try:
+        struct.pack_into("<I", writer.buf, off, seq + 1)
+        assert reader.get(0x13) is None
+        struct.pack_into("<I", writer.buf, off, seq + 2)
+        assert reader.get(0x13) == "addi zero, zero, 0"
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_eviction_keeps_frequently_hit_words(shared):
+    table = shared(slots=4, ways=4)
+    words = [0x13 + (i << 20) for i in range(4)]
+    for word in words:
+        table.decode(word)
+    for _ in range(3):
+        reader = memo.DecodeMemo.attach(table.name, table.lock)
+        assert reader.get(words[2]) is not None
+        reader.close()
+
+    table.decode(0x13 + (4 << 20))
+    assert table.stats()["evictions"] == 1
+    assert slot_of(table, words[2]) is not None
+    assert slot_of(table, 0x13 + (4 << 20)) is not None
+
+
+def decode_all(words):
+    decoder = memo.get_memo()
+    misses = decoder.misses
+    res = [decoder.decode(word) for word in words]
+    decoder.flush()
+    return res, decoder.misses - misses
+
+
+def test_pool_workers_share_decoded_words(shared, elf_file):
+    table = shared()
+    words = sorted(text_words(elf_file("test.elf")))
+    context = memo.pool_context()
+    with context.Pool(2, initializer=memo.init_worker, initargs=(table.name, table.lock)) as pool:
+        first, _ = pool.apply(decode_all, (words,))
+        results = pool.map(decode_all, [words, words], chunksize=1)
+    assert all(slot_of(table, word) is not None for word in words)
+    # whichever worker runs them, the second pass is served by the local LRU or the shared table
+    for decoded, misses in results:
+        assert decoded == first
+        assert misses == 0
+
+
+def test_stats_include_pool_workers(shared, elf_file):
+    table = shared()
+    words = sorted(text_words(elf_file("test.elf")))
+    context = memo.pool_context()
+    with context.Pool(2, initializer=memo.init_worker, initargs=(table.name, table.lock)) as pool:
+        pool.apply(decode_all, (words,))
+        pool.map(decode_all, [words, words], chunksize=1)
+    # every lookup happened in a worker, the parent only reads the totals
+    stats = table.stats()
+    assert stats["hits"] + stats["shared_hits"] + stats["misses"] == 3 * len(words)
+    assert stats["misses"] == len(words)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_disassemble_reuses_shared_memo(shared, elf_file, workers):
+    table = shared()
+    misses = []
+    for _ in range(2):
+        pipe = main.disassemble(elf_file("test2.elf"), io.StringIO(), workers=workers, shared_memo=table)
+        assert pipe.shared_memo is table
+        misses.append(pipe.metrics()["memo"]["misses"])
+    # the second file decodes entirely from the table the first one filled
+    assert misses[0] == len(text_words(elf_file("test2.elf")))
+    assert misses[1] == misses[0]
@@ -0,0 +1,113 @@
+import io
+import itertools
+import time
+from functools import partial
+
+import pytest
+
+import elf
+import main
+from pipeline import Pipeline
+
+
+def double(item):
+    return 2 * item
+
+
+def fail_on(bad, item):
+    if item == bad:
+        raise ValueError(f"cannot decode {item}")
+    return item
+
+
+def failing_source(n):
+    yield from range(n)
+    raise OSError("truncated input")
+
+
+def run(source, decode=double, **kwargs):
+    out = []
+    pipe = Pipeline(source, decode, out.append, **kwargs)
+    pipe.run()
+    return out, pipe
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_keeps_source_order(workers):
+    out, pipe = run(range(100), workers=workers, queue_size=4)
+    assert out == [2 * i for i in range(100)]
+    stages = pipe.metrics()["stages"]
+    assert [stages[name]["items"] for name in ["reader", "decoder", "writer"]] == [100, 100, 100]
+
+
+def test_slow_writer_applies_backpressure():
+    out = []
+
+    def write(item):
+        time.sleep(0.002)
+        out.append(item)
+
+    pipe = Pipeline(range(50), double, write, queue_size=2)
+    pipe.run()
+    assert out == [2 * i for i in range(50)]
+    metrics = pipe.metrics()
+    for name in ["chunks", "decoded"]:
+        assert metrics["queues"][name]["maxsize"] == 2
+        assert 1 <= metrics["queues"][name]["max_depth"] <= 2
+    # the reader spent its time waiting for room, not reading
+    reader = metrics["stages"]["reader"]
+    assert reader["blocked"] > reader["busy"]
+    assert metrics["stages"]["writer"]["busy"] >= 50 * 0.002
+
+
+def test_writer_error_cancels_the_reader():
+    def write(item):
+        if item == 6:
+            raise RuntimeError("disk full")
+
+    # the source never ends, run() only returns because the writer's error stops the reader
+    pipe = Pipeline(itertools.count(), double, write, queue_size=2)
+    with pytest.raises(RuntimeError, match="disk full"):
+        pipe.run()
+    # at most: written items, two queues full, one item in each of the reader and decoder
+    assert pipe.metrics()["stages"]["reader"]["items"] <= 4 + 2 * 2 + 2
+
+
+def test_reader_error_reaches_run():
+    out = []
+    pipe = Pipeline(failing_source(10), double, out.append)
+    with pytest.raises(OSError, match="truncated input"):
+        pipe.run()
+    assert out == [2 * i for i in range(len(out))]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_decoder_error_reaches_run(workers):
+    pipe = Pipeline(range(100), partial(fail_on, 10), lambda item: None, queue_size=4, workers=workers)
+    with pytest.raises(ValueError, match="cannot decode 10"):
+        pipe.run()
+
+
+def test_metrics():
+    _, pipe = run(range(10))
+    metrics = pipe.metrics()
+    assert set(metrics) == {"stages", "queues"}
+    for stage in metrics["stages"].values():
+        assert set(stage) == {"items", "busy", "blocked", "wall", "throughput"}
+        assert stage["items"] == 10
+        assert stage["wall"] > 0 and stage["throughput"] > 0
+    for q in metrics["queues"].values():
+        # every item plus the end marker went through, and nothing is left behind
+        assert q["depth"] == 0
+        assert 0 < q["mean_depth"] <= q["max_depth"] <= q["maxsize"]
+
+
+def test_process_pool_decodes_like_threads(elf_file):
+    outputs = []
+    for workers in [0, 2]:
+        out = io.StringIO()
+        pipe = main.disassemble(elf_file("test2.elf"), out, workers=workers, queue_size=2)
+        outputs.append(out.getvalue())
+        assert pipe.metrics()["stages"]["decoder"]["items"] == pipe.metrics()["stages"]["reader"]["items"]
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count("\n") == 1 + elf_file("test2.elf").text_header.size // elf.COMMAND_SIZE
@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+import elf
+
+STRTAB = b"\x00main\x00__libc_start_main\x00foo_bar\x00foo\x00"
+MAIN, LIBC_START_MAIN, FOO_BAR, FOO = 1, 6, 24, 32
+# name offset, value, size, info, other, shndx
+SYMBOLS = [
+    (0, 0, 0, 0x00, 0, 0),
+    (MAIN, 0x10144, 108, 0x12, 0, 1),
+    (LIBC_START_MAIN, 0x10200, 40, 0x12, 0, 0x101),
+    # tail-merged: the linker points these names into longer strings
+    (LIBC_START_MAIN + 13, 0x10300, 8, 0x02, 0, 1),  # "main"
+    (LIBC_START_MAIN + 7, 0x10400, 16, 0x22, 0, 0x201),  # "start_main"
+    (FOO_BAR, 0x20000, 4, 0x11, 0, 0x201),
+    (FOO_BAR + 4, 0x20010, 64, 0x11, 0, 0x101),  # "bar"
+    (FOO, 0x10500, 12, 0x02, 0, 0x101),
+    (0, 0, 0, 0x04, 0, 0xfff1),
+]
+
+
+@pytest.fixture
+def columns():
+    return elf.SymtabColumns(b"".join(struct.pack("<IIIBBH", *sym) for sym in SYMBOLS), STRTAB)
+
+
+def name(sym):
+    return STRTAB[sym[0]:STRTAB.index(b"\x00", sym[0])].decode() if sym[0] else ""
+
+
+def expected(types=(), bindings=(), shndx=None, prefix=""):
+    return [i for i, sym in enumerate(SYMBOLS)
+            if (not types or sym[3] & 15 in types) and (not bindings or sym[3] >> 4 in bindings)
+            and (shndx is None or sym[5] == shndx) and name(sym).startswith(prefix)]
+
+
+def test_names_are_resolved(columns):
+    assert [columns.name(i) for i in range(len(columns))] == [name(sym) for sym in SYMBOLS]
+    assert columns.name(3) == "main"
+
+
+@pytest.mark.parametrize("prefix", ["main", "start", "ma", "foo", "bar", "_", "__libc_start_main", "x", "main\0"])
+def test_prefix_matches_tail_merged_names(columns, prefix):
+    assert columns.query(prefix=prefix) == expected(prefix=prefix)
+
+
+def test_tail_merged_name_is_found(columns):
+    assert columns.query(prefix="main") == [1, 3]
+    assert columns.query(prefix="start") == [4]
+
+
+@pytest.mark.parametrize("shndx", [0, 1, 0x101, 0x201, 0x102, 0xff01, "UNDEF", "ABS"])
+def test_shndx_compares_both_bytes(columns, shndx):
+    code = {"UNDEF": 0, "ABS": 0xfff1}.get(shndx, shndx)
+    assert columns.query(shndx=shndx) == expected(shndx=code)
+
+
+def test_shndx_above_255(columns):
+    # 0x101 and 0x201 share their low byte with section 1
+    assert columns.query(shndx=0x101) == [2, 6, 7]
+    assert columns.query(shndx=0x201) == [4, 5]
+    assert columns.query(shndx=1) == [1, 3]
+
+
+@pytest.mark.parametrize("types, bindings, shndx, prefix", [
+    ("FUNC", None, 1, "main"),
+    ("FUNC", "GLOBAL", 0x101, "_"),
+    ("OBJECT", None, 0x101, "bar"),
+    (["FUNC", "OBJECT"], ["LOCAL", "WEAK"], 0x201, "s"),
+    ("FUNC", None, 0x201, "foo"),
+])
+def test_combined_filters(columns, types, bindings, shndx, prefix):
+    codes = elf._codes(types, elf.SYMBOL_TYPES) or ()
+    binding_codes = elf._codes(bindings, elf.SYMBOL_BINDINGS) or ()
+    res = columns.query(types=types, bindings=bindings, shndx=shndx, prefix=prefix)
+    assert res == expected(codes, binding_codes, shndx, prefix)
+
+
+def test_each_filter_narrows_the_others(columns):
+    assert columns.query(prefix="foo") == [5, 7]
+    assert columns.query(types="FUNC", prefix="foo") == [7]
+    assert columns.query(types="FUNC", shndx=0x201, prefix="foo") == []
+    assert columns.query(types="FUNC", shndx=0x101, prefix="foo") == [7]
+
+
+def test_sort(columns):
+    assert columns.query(types="FUNC", sort="value") == [1, 2, 3, 4, 7]
+    assert columns.query(types="FUNC", sort="size", reverse=True) == [1, 2, 4, 7, 3]
+
+
+def test_top_with_sort(columns):
+    assert columns.query(top=2) == [1, 6]
+    assert columns.query(top=2, sort="value") == [6, 5]
+    assert columns.query(types="FUNC", top=2, sort="value") == [7, 4]
+    # reverse picks the smallest keys, smallest first
+    assert columns.query(types="OBJECT", top=1, reverse=True) == [5]
+    assert columns.query(types="FUNC", top=3, sort="value", reverse=True) == [1, 2, 3]
+    assert columns.query(prefix="x", top=3) == []
+
+
+@pytest.mark.parametrize("query", [dict(types="FUNCTION"), dict(bindings="PUBLIC"), dict(shndx="COMMON"),
+                                   dict(sort="name"), dict(top=1, sort="address")])
+def test_rejects_unknown_names(columns, query):
+    with pytest.raises(ValueError):
+        columns.query(**query)